@@ -2,13 +2,25 @@
 """
 Extract individual parking SPACE nodes from OpenStreetMap for entire Netherlands.
 These are amenity=parking_space tags, not parking area boundaries.
-Uses regional queries with 5-second delays to respect Overpass API rate limits.
+Uses regional queries and waits for a free Overpass query slot (as reported by
+the server's /api/status) before each one to respect Overpass API rate limits.
+Regions are fetched concurrently, at most two at a time (Overpass allows two
+query slots per IP address).
 """
 
+import gzip
+import hashlib
 import json
+import os
+import re
 import requests
+import sys
 import time
-from typing import Dict, List
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Netherlands bounding box with generous buffer
 NETHERLANDS_BOUNDS = {
@@ -18,6 +30,55 @@ NETHERLANDS_BOUNDS = {
     'max_lon': 7.25    # Eastern border (with buffer)
 }
 
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+OVERPASS_STATUS_URL = "https://overpass-api.de/api/status"
+
+# Overpass API grants two concurrent query slots per IP address
+OVERPASS_MAX_CONCURRENT = 2
+
+# /api/status lines: "2 slots available now." or
+# "Slot available after: 2025-01-01T12:00:05Z, in 3 seconds."
+SLOTS_AVAILABLE_RE = re.compile(r'^([1-9]\d*) slots? available now', re.MULTILINE)
+SLOT_WAIT_RE = re.compile(r'^Slot available after: \S+, in (-?\d+) seconds?', re.MULTILINE)
+
+# Retry failed Overpass queries (connection errors, timeouts, 429 and 5xx
+# responses) with exponential backoff, honouring any Retry-After header
+OVERPASS_MAX_RETRIES = 3
+OVERPASS_RETRY_BACKOFF = 5  # seconds, doubled on each further retry
+
+# On-disk cache of raw Overpass responses, keyed by a hash of the query text
+# (so a changed query never hits an old entry). Bump OVERPASS_CACHE_VERSION
+# only when the stored format or the handling of cached responses changes.
+OVERPASS_CACHE_DIR = os.path.join('.cache', 'overpass')
+OVERPASS_CACHE_VERSION = 1
+OVERPASS_CACHE_MAX_AGE = 24 * 60 * 60  # seconds
+
+# Optional OSM tags copied onto each feature as (property, tag). Absent tags
+# are omitted rather than written as 'N/A' placeholders, which keeps the
+# nationwide GeoJSON (and the province tiles built from it) smaller.
+OPTIONAL_TAG_PROPERTIES = (
+    ('capacity_type', 'capacity'),
+    ('access', 'access'),
+    ('orientation', 'orientation'),
+    ('parking', 'parking'),
+    ('surface', 'surface'),
+)
+
+# Shared session: reuses TCP/TLS connections across regional queries (one
+# pooled connection per worker) and retries at the transport level
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=OVERPASS_MAX_CONCURRENT,
+    max_retries=Retry(
+        total=OVERPASS_MAX_RETRIES,
+        backoff_factor=OVERPASS_RETRY_BACKOFF,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'POST'}),  # Overpass queries are read-only
+        raise_on_status=False
+    )
+))
+
 def create_regional_grid(bounds: Dict, rows: int = 3, cols: int = 2) -> List[Dict]:
     """Divide Netherlands into smaller regions to avoid Overpass timeouts."""
     regions = []
@@ -38,10 +99,69 @@ def create_regional_grid(bounds: Dict, rows: int = 3, cols: int = 2) -> List[Dic
 
     return regions
 
-def query_osm_parking_spaces_region(region: Dict, delay: int = 5) -> Dict:
-    """Query OSM Overpass API for individual parking space nodes in a region."""
-    overpass_url = "https://overpass-api.de/api/interpreter"
+def overpass_cache_path(query: str) -> str:
+    """Path of the cache file for an Overpass query."""
+    key = hashlib.sha256(f"{OVERPASS_CACHE_VERSION}:{query}".encode('utf-8')).hexdigest()
+    return os.path.join(OVERPASS_CACHE_DIR, f"{key}.json.gz")
+
+def load_cached_response(query: str) -> Optional[Dict]:
+    """Return the cached Overpass response for a query, or None if missing or stale."""
+    path = overpass_cache_path(query)
+    try:
+        if time.time() - os.path.getmtime(path) > OVERPASS_CACHE_MAX_AGE:
+            return None
+        with gzip.open(path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, EOFError, ValueError):
+        return None
+
+def save_cached_response(query: str, content: bytes):
+    """Store a raw Overpass response body (gzip-compressed) in the cache.
+
+    Written to a temporary file and moved into place, so an interrupted run
+    never leaves a truncated entry (or a stray temporary file) behind.
+    """
+    os.makedirs(OVERPASS_CACHE_DIR, exist_ok=True)
+    path = overpass_cache_path(query)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def wait_for_overpass_slot(fallback_delay: int = 5):
+    """Block until Overpass reports a free query slot for this IP address.
+
+    Follows the server's own rate-limit report instead of pausing a fixed
+    time; sleeps fallback_delay seconds if the status cannot be read.
+    """
+    try:
+        response = SESSION.get(OVERPASS_STATUS_URL, timeout=30)
+        response.raise_for_status()
+        status = response.text
+    except requests.RequestException:
+        time.sleep(fallback_delay)
+        return
+
+    if SLOTS_AVAILABLE_RE.search(status):
+        return
+
+    waits = [int(seconds) for seconds in SLOT_WAIT_RE.findall(status)]
+    wait = max(min(waits), 0) if waits else fallback_delay
+    if wait > 0:
+        print(f"  ⏳ Waiting {wait} seconds for a free Overpass slot...")
+        time.sleep(wait)
 
+def query_osm_parking_spaces_region(region: Dict, delay: int = 5, use_cache: bool = True) -> Dict:
+    """Query OSM Overpass API for individual parking space nodes in a region.
+
+    delay is only used as the wait when the Overpass slot status is unavailable.
+    With use_cache=False the on-disk cache is bypassed (but still refreshed).
+    """
     bbox_str = f"{region['min_lat']},{region['min_lon']},{region['max_lat']},{region['max_lon']}"
 
     # Query for individual parking spaces
@@ -54,42 +174,62 @@ def query_osm_parking_spaces_region(region: Dict, delay: int = 5) -> Dict:
       // Also get parking spaces as ways (some are mapped as small polygons)
       way["amenity"="parking_space"]({bbox_str});
     );
-    out body;
-    >;
-    out skel qt;
+    // Inline way geometry: no recursion into (and separate output of) member nodes
+    out geom;
     """
 
     print(f"Querying {region['name']}...")
     print(f"  Bounding box: {bbox_str}")
 
+    cached = load_cached_response(overpass_query) if use_cache else None
+    if cached is not None:
+        print(f"  ✓ {region['name']}: found {len(cached.get('elements', []))} OSM elements (cached)")
+        return cached
+
+    wait_for_overpass_slot(delay)
+
     try:
-        response = requests.post(
-            overpass_url,
+        response = SESSION.post(
+            OVERPASS_URL,
             data={"data": overpass_query},
             timeout=300
         )
         response.raise_for_status()
         data = response.json()
 
-        elements = data.get('elements', [])
-        print(f"  ✓ Found {len(elements)} OSM elements")
+        # A query that times out or runs out of memory still returns HTTP 200,
+        # with a "runtime error" remark and missing elements; never cache that
+        remark = data.get('remark', '')
+        if 'runtime error' in remark:
+            print(f"  ✗ {region['name']}: Overpass query failed: {remark}")
+            return {'elements': []}
 
-        # Delay before next request
-        if delay > 0:
-            print(f"  ⏳ Waiting {delay} seconds before next request...")
-            time.sleep(delay)
+        # The cache is only an optimisation: a failed write must not lose the data
+        try:
+            save_cached_response(overpass_query, response.content)
+        except OSError as e:
+            print(f"  ⚠ {region['name']}: could not cache response: {e}")
+
+        elements = data.get('elements', [])
+        print(f"  ✓ {region['name']}: found {len(elements)} OSM elements")
 
         return data
-    except Exception as e:
-        print(f"  ✗ Error querying OSM: {e}")
+    except (requests.RequestException, ValueError) as e:
+        # Network/HTTP failures (after the session's retries) and bad JSON;
+        # anything else is a bug and should not be reported as "no data"
+        print(f"  ✗ {region['name']}: error querying OSM: {e}")
         return {'elements': []}
 
-def extract_parking_spaces(osm_data: Dict) -> List[Dict]:
-    """Extract parking space features from OSM response."""
-    elements = osm_data.get('elements', [])
+def extract_parking_spaces(osm_data: Dict, seen: Optional[set] = None) -> List[Dict]:
+    """Extract parking space features from OSM response.
 
-    # Build node lookup for ways
-    nodes = {e['id']: e for e in elements if e['type'] == 'node'}
+    Elements whose (type, id) is already in ``seen`` are skipped before any
+    geometry is built; new ones are added to it. Node and way ids are separate
+    namespaces in OSM, so the id alone is not unique.
+    """
+    elements = osm_data.get('elements', [])
+    if seen is None:
+        seen = set()
 
     parking_spaces = []
 
@@ -100,6 +240,11 @@ def extract_parking_spaces(osm_data: Dict) -> List[Dict]:
         if tags.get('amenity') != 'parking_space':
             continue
 
+        # Skip elements already extracted (regions may overlap at boundaries)
+        key = (element['type'], element['id'])
+        if key in seen:
+            continue
+
         geometry = None
 
         # Handle point parking spaces
@@ -110,12 +255,10 @@ def extract_parking_spaces(osm_data: Dict) -> List[Dict]:
             }
 
         # Handle polygon parking spaces
-        elif element['type'] == 'way' and 'nodes' in element:
-            coords = []
-            for node_id in element['nodes']:
-                if node_id in nodes:
-                    node = nodes[node_id]
-                    coords.append([node['lon'], node['lat']])
+        # (geometry is inlined by "out geom"; unresolvable nodes come back as null)
+        elif element['type'] == 'way' and 'geometry' in element:
+            coords = [[point['lon'], point['lat']]
+                      for point in element['geometry'] if point is not None]
 
             if len(coords) >= 3:
                 geometry = {
@@ -124,88 +267,92 @@ def extract_parking_spaces(osm_data: Dict) -> List[Dict]:
                 }
 
         if geometry:
+            seen.add(key)
+
             # Determine vehicle type (will be reclassified by size later)
             capacity_type = tags.get('capacity:disabled', tags.get('capacity:hgv', ''))
             vehicle_type = 'truck' if 'hgv' in capacity_type.lower() else 'car'
 
+            properties = {
+                'feature_type': 'osm_parking_space',
+                'osm_id': element['id'],
+                'osm_type': element['type'],
+                'vehicle_type': vehicle_type,
+            }
+            for prop, tag in OPTIONAL_TAG_PROPERTIES:
+                value = tags.get(tag)
+                if value:
+                    properties[prop] = value
+
             parking_space = {
                 'type': 'Feature',
                 'geometry': geometry,
-                'properties': {
-                    'feature_type': 'osm_parking_space',
-                    'osm_id': element['id'],
-                    'osm_type': element['type'],
-                    'vehicle_type': vehicle_type,
-                    'capacity_type': tags.get('capacity', 'N/A'),
-                    'access': tags.get('access', 'N/A'),
-                    'orientation': tags.get('orientation', 'N/A'),
-                    'parking': tags.get('parking', 'N/A'),
-                    'surface': tags.get('surface', 'N/A'),
-                }
+                'properties': properties
             }
             parking_spaces.append(parking_space)
 
     return parking_spaces
 
-def deduplicate_parking_spaces(all_spaces: List[Dict]) -> List[Dict]:
-    """Remove duplicate parking spaces based on OSM ID."""
-    seen_ids = set()
-    unique_spaces = []
-
-    for space in all_spaces:
-        osm_id = space['properties']['osm_id']
-        if osm_id not in seen_ids:
-            seen_ids.add(osm_id)
-            unique_spaces.append(space)
-
-    return unique_spaces
-
-def main():
+def main(refresh: bool = False):
     print("=" * 80)
     print("OSM INDIVIDUAL PARKING SPACES EXTRACTION - NETHERLANDS")
     print("=" * 80)
     print()
 
+    if refresh:
+        print("Ignoring cached Overpass responses (--refresh)")
+        print()
+
     # Create regional grid
     regions = create_regional_grid(NETHERLANDS_BOUNDS, rows=3, cols=2)
     print(f"Divided Netherlands into {len(regions)} regions")
     print()
 
-    # Query each region with 5-second delays
-    all_parking_spaces = []
+    # Query regions concurrently, bounded by the Overpass slots per IP.
+    # Duplicates across region boundaries are dropped during extraction.
+    unique_spaces = []
+    seen_elements = set()
 
-    for i, region in enumerate(regions, 1):
-        print(f"[{i}/{len(regions)}] Processing {region['name']}")
-        osm_data = query_osm_parking_spaces_region(region, delay=5)
+    with ThreadPoolExecutor(max_workers=OVERPASS_MAX_CONCURRENT) as executor:
+        responses = executor.map(
+            lambda region: query_osm_parking_spaces_region(region, delay=5, use_cache=not refresh),
+            regions
+        )
 
-        # Extract parking spaces from this region
-        parking_spaces = extract_parking_spaces(osm_data)
-        all_parking_spaces.extend(parking_spaces)
+        # Results are pulled with next() rather than unpacked from zip(), whose
+        # reused result tuple would keep a reference to the previous payload
+        for i, region in enumerate(regions, 1):
+            osm_data = next(responses)
+            print(f"[{i}/{len(regions)}] Processing {region['name']}")
 
-        print(f"  Region total: {len(parking_spaces)} parking spaces")
-        print()
+            # Extract parking spaces from this region
+            parking_spaces = extract_parking_spaces(osm_data, seen_elements)
+            unique_spaces.extend(parking_spaces)
 
-    # Deduplicate (regions may overlap at boundaries)
-    print("Deduplicating parking spaces...")
-    unique_spaces = deduplicate_parking_spaces(all_parking_spaces)
+            # Release the raw Overpass payload as soon as it is extracted,
+            # so finished regions do not pile up in memory
+            del osm_data
+
+            print(f"  Region total: {len(parking_spaces)} new parking spaces")
+            print()
 
     print(f"✓ Total extracted: {len(unique_spaces)} unique parking spaces")
     print()
 
-    # Count by type (before size-based reclassification)
-    truck_spaces = [s for s in unique_spaces if s['properties']['vehicle_type'] == 'truck']
-    car_spaces = [s for s in unique_spaces if s['properties']['vehicle_type'] == 'car']
+    # Count by vehicle type (before size-based reclassification) and by
+    # geometry type in a single pass
+    vehicle_counts = Counter()
+    geometry_counts = Counter()
+    for space in unique_spaces:
+        vehicle_counts[space['properties']['vehicle_type']] += 1
+        geometry_counts[space['geometry']['type']] += 1
 
-    print(f"  Truck/HGV spaces (tag-based): {len(truck_spaces)}")
-    print(f"  Car spaces (tag-based): {len(car_spaces)}")
+    print(f"  Truck/HGV spaces (tag-based): {vehicle_counts['truck']}")
+    print(f"  Car spaces (tag-based): {vehicle_counts['car']}")
     print()
 
-    # Count by geometry type
-    point_spaces = [s for s in unique_spaces if s['geometry']['type'] == 'Point']
-    polygon_spaces = [s for s in unique_spaces if s['geometry']['type'] == 'Polygon']
-
-    print(f"  Point geometries: {len(point_spaces)}")
-    print(f"  Polygon geometries: {len(polygon_spaces)}")
+    print(f"  Point geometries: {geometry_counts['Point']}")
+    print(f"  Polygon geometries: {geometry_counts['Polygon']}")
     print()
 
     # Save output
@@ -216,7 +363,7 @@ def main():
 
     output_file = "netherlands_osm_individual_parking_spaces.geojson"
     with open(output_file, 'w') as f:
-        json.dump(output, f, indent=2)
+        json.dump(output, f, separators=(',', ':'))  # Compact JSON
 
     print(f"✓ Saved to: {output_file}")
     print()
@@ -225,4 +372,5 @@ def main():
     print("=" * 80)
 
 if __name__ == "__main__":
-    main()
+    # --refresh: re-query Overpass even if a fresh cached response exists
+    main(refresh='--refresh' in sys.argv[1:])
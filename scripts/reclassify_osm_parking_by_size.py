@@ -14,6 +14,9 @@ Car spaces are typically 2.5m × 5m (12-15m²)
 
 import json
 import math
+import os
+import shutil
+import sys
 
 METERS_PER_DEGREE_LAT = 111320
 METERS_PER_DEGREE_LON = 70000
@@ -22,6 +25,11 @@ METERS_PER_DEGREE_LON = 70000
 TRUCK_MIN_WIDTH = 3.5   # meters
 TRUCK_MIN_LENGTH = 13.0  # meters
 
+SIZE_BASED_METHOD = 'size-based (CROW ASVV 2021)'
+
+# Web app directory that receives a copy of the reclassified file
+PUBLIC_DIR = "truck-parking-map/public"
+
 def calculate_distance(p1, p2):
     """Calculate distance between two lon/lat points in meters."""
     lat_diff = (p2[1] - p1[1]) * METERS_PER_DEGREE_LAT
@@ -44,7 +52,14 @@ def calculate_polygon_dimensions(coords):
 
     return width, length, area
 
-def reclassify_parking_spaces(input_file, output_file):
+def classify_by_size(width, length):
+    """Return 'truck' or 'car' for the given dimensions (CROW ASVV 2021)."""
+    # Truck space requires BOTH width >= 3.5m AND length >= 13m
+    if width >= TRUCK_MIN_WIDTH and length >= TRUCK_MIN_LENGTH:
+        return 'truck'
+    return 'car'
+
+def reclassify_parking_spaces(input_file, output_file, public_dir=PUBLIC_DIR):
     """Reclassify parking spaces based on size."""
 
     print("=" * 80)
@@ -66,33 +81,33 @@ def reclassify_parking_spaces(input_file, output_file):
     point_count = 0
 
     for feature in data['features']:
-        if feature['geometry']['type'] == 'Polygon':
-            coords = feature['geometry']['coordinates'][0]
-            width, length, area = calculate_polygon_dimensions(coords)
+        geometry = feature['geometry']
+        properties = feature['properties']
+
+        if geometry['type'] == 'Polygon':
+            width, length, area = calculate_polygon_dimensions(geometry['coordinates'][0])
 
             if width and length and area:
                 # Store dimensions in properties
-                feature['properties']['width_m'] = round(width, 2)
-                feature['properties']['length_m'] = round(length, 2)
-                feature['properties']['area_m2'] = round(area, 1)
+                properties['width_m'] = round(width, 2)
+                properties['length_m'] = round(length, 2)
+                properties['area_m2'] = round(area, 1)
 
                 # Reclassify based on CROW ASVV 2021 criteria
-                # Truck space requires BOTH width >= 3.5m AND length >= 13m
-                if width >= TRUCK_MIN_WIDTH and length >= TRUCK_MIN_LENGTH:
-                    feature['properties']['vehicle_type'] = 'truck'
-                    feature['properties']['classification_method'] = 'size-based (CROW ASVV 2021)'
+                vehicle_type = classify_by_size(width, length)
+                properties['vehicle_type'] = vehicle_type
+                properties['classification_method'] = SIZE_BASED_METHOD
+                if vehicle_type == 'truck':
                     truck_count += 1
                 else:
-                    feature['properties']['vehicle_type'] = 'car'
-                    feature['properties']['classification_method'] = 'size-based (CROW ASVV 2021)'
                     car_count += 1
 
-        elif feature['geometry']['type'] == 'Point':
+        elif geometry['type'] == 'Point':
             # For point geometries, we can't calculate size
             # Keep original classification or default to car
-            feature['properties']['classification_method'] = 'tag-based'
+            properties['classification_method'] = 'tag-based'
             point_count += 1
-            if feature['properties']['vehicle_type'] == 'truck':
+            if properties['vehicle_type'] == 'truck':
                 truck_count += 1
             else:
                 car_count += 1
@@ -107,24 +122,20 @@ def reclassify_parking_spaces(input_file, output_file):
 
     # Save reclassified data
     with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2)
+        json.dump(data, f, separators=(',', ':'))  # Compact JSON
 
     print(f"✓ Saved reclassified data to: {output_file}")
 
     # Also copy to public directory (use output filename)
-    import os
     public_filename = os.path.basename(output_file)
-    public_file = f"truck-parking-map/public/{public_filename}"
-    with open(public_file, 'w') as f:
-        json.dump(data, f, indent=2)
-
-    print(f"✓ Copied to: {public_file}")
+    public_file = os.path.join(public_dir, public_filename)
+    if os.path.abspath(public_file) != os.path.abspath(output_file):
+        shutil.copyfile(output_file, public_file)  # no second serialization
+        print(f"✓ Copied to: {public_file}")
 
     return truck_count, car_count
 
 if __name__ == "__main__":
-    import sys
-
     # Support command-line argument for input file
     if len(sys.argv) > 1:
         input_file = sys.argv[1]
@@ -133,11 +144,14 @@ if __name__ == "__main__":
         input_file = "rotterdam_osm_individual_parking_spaces.geojson"
         output_file = "rotterdam_osm_individual_parking_spaces_reclassified.geojson"
 
+    # Optional second argument: directory for the public copy
+    public_dir = sys.argv[2] if len(sys.argv) > 2 else PUBLIC_DIR
+
     print(f"Input: {input_file}")
     print(f"Output: {output_file}")
     print()
 
-    truck_count, car_count = reclassify_parking_spaces(input_file, output_file)
+    truck_count, car_count = reclassify_parking_spaces(input_file, output_file, public_dir)
 
     print()
     print("=" * 80)
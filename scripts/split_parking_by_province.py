@@ -6,7 +6,12 @@ Uses approximate province bounding boxes.
 
 import json
 import gzip
-from typing import Dict, List
+import math
+import os
+import sys
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, List, Optional
 
 # Approximate bounding boxes for Dutch provinces
 PROVINCES = {
@@ -60,11 +65,42 @@ PROVINCES = {
     }
 }
 
+# Cell size (degrees) of the grid index over province bounding boxes
+GRID_CELL_SIZE = 0.05
+
 def point_in_bounds(lon: float, lat: float, bounds: Dict) -> bool:
     """Check if a point is within bounding box."""
     return (bounds['min_lat'] <= lat <= bounds['max_lat'] and
             bounds['min_lon'] <= lon <= bounds['max_lon'])
 
+def grid_cell(lon: float, lat: float, cell_size: float = GRID_CELL_SIZE) -> tuple:
+    """Grid cell (row, col) containing a point."""
+    return (math.floor(lat / cell_size), math.floor(lon / cell_size))
+
+def build_province_grid(provinces: Dict, cell_size: float = GRID_CELL_SIZE) -> Dict[tuple, List]:
+    """Index province bounding boxes by the grid cells they overlap.
+
+    Each cell lists its candidate provinces in PROVINCES order, so a lookup
+    returns the same (first matching) province as a linear scan.
+    """
+    grid = {}
+    for province_key, province_info in provinces.items():
+        bounds = province_info['bounds']
+        min_row, min_col = grid_cell(bounds['min_lon'], bounds['min_lat'], cell_size)
+        max_row, max_col = grid_cell(bounds['max_lon'], bounds['max_lat'], cell_size)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                grid.setdefault((row, col), []).append((province_key, province_info))
+    return grid
+
+def find_province(lon: float, lat: float, grid: Dict[tuple, List],
+                  cell_size: float = GRID_CELL_SIZE) -> Optional[tuple]:
+    """Return (province_key, province_info) for a point, or None if unassigned."""
+    for province_key, province_info in grid.get(grid_cell(lon, lat, cell_size), ()):
+        if point_in_bounds(lon, lat, province_info['bounds']):
+            return province_key, province_info
+    return None
+
 def get_feature_centroid(feature: Dict) -> tuple:
     """Get centroid of a feature (for province assignment)."""
     geometry = feature['geometry']
@@ -74,9 +110,9 @@ def get_feature_centroid(feature: Dict) -> tuple:
 
     elif geometry['type'] == 'Polygon':
         coords = geometry['coordinates'][0]
-        # Simple centroid calculation
-        lon_sum = sum(c[0] for c in coords)
-        lat_sum = sum(c[1] for c in coords)
+        # Simple centroid calculation (map/itemgetter keeps the sums in C)
+        lon_sum = sum(map(itemgetter(0), coords))
+        lat_sum = sum(map(itemgetter(1), coords))
         count = len(coords)
         return (lon_sum / count, lat_sum / count)
 
@@ -103,30 +139,28 @@ def split_by_province(input_file: str, output_dir: str = "truck-parking-map/publ
     province_data = {key: [] for key in PROVINCES.keys()}
     unassigned = []
 
-    # Assign features to provinces
+    # Assign features to provinces (grid index avoids testing every province)
     print("Assigning parking spaces to provinces...")
+    province_grid = build_province_grid(PROVINCES)
+
     for i, feature in enumerate(data['features']):
         if (i + 1) % 50000 == 0:
             print(f"  Processed {i + 1:,} / {total_features:,} features...")
 
         lon, lat = get_feature_centroid(feature)
-        assigned = False
+        match = find_province(lon, lat, province_grid)
 
-        for province_key, province_info in PROVINCES.items():
-            if point_in_bounds(lon, lat, province_info['bounds']):
-                feature['properties']['province'] = province_info['name']
-                province_data[province_key].append(feature)
-                assigned = True
-                break
-
-        if not assigned:
+        if match:
+            province_key, province_info = match
+            feature['properties']['province'] = province_info['name']
+            province_data[province_key].append(feature)
+        else:
             unassigned.append(feature)
 
     print(f"✓ Assignment complete")
     print()
 
     # Save province files (both regular and gzipped)
-    import os
     os.makedirs(output_dir, exist_ok=True)
 
     print("PROVINCE BREAKDOWN:")
@@ -139,8 +173,9 @@ def split_by_province(input_file: str, output_dir: str = "truck-parking-map/publ
             continue
 
         province_name = PROVINCES[province_key]['name']
-        truck_count = len([f for f in features if f['properties']['vehicle_type'] == 'truck'])
-        car_count = len([f for f in features if f['properties']['vehicle_type'] == 'car'])
+        vehicle_counts = Counter(f['properties']['vehicle_type'] for f in features)
+        truck_count = vehicle_counts['truck']
+        car_count = vehicle_counts['car']
 
         # Create GeoJSON
         geojson = {
@@ -148,15 +183,18 @@ def split_by_province(input_file: str, output_dir: str = "truck-parking-map/publ
             'features': features
         }
 
+        # Serialize once, then write both the regular and gzipped files
+        content = json.dumps(geojson, separators=(',', ':')).encode('utf-8')  # Compact JSON
+
         # Save regular JSON
         output_file = f"{output_dir}/{province_key}_parking_spaces.geojson"
-        with open(output_file, 'w') as f:
-            json.dump(geojson, f, separators=(',', ':'))  # Compact JSON
+        with open(output_file, 'wb') as f:
+            f.write(content)
 
         # Save gzipped version
         output_file_gz = f"{output_dir}/{province_key}_parking_spaces.geojson.gz"
-        with gzip.open(output_file_gz, 'wt', encoding='utf-8') as f:
-            json.dump(geojson, f, separators=(',', ':'))
+        with gzip.open(output_file_gz, 'wb') as f:
+            f.write(content)
 
         # Get file sizes
         regular_size = os.path.getsize(output_file) / 1024 / 1024  # MB
@@ -209,7 +247,7 @@ def split_by_province(input_file: str, output_dir: str = "truck-parking-map/publ
 
     index_file = f"{output_dir}/province_index.json"
     with open(index_file, 'w') as f:
-        json.dump(province_index, f, indent=2)
+        json.dump(province_index, f, separators=(',', ':'))  # Compact JSON (fetched by the map)
 
     print(f"✓ Saved province index to: {index_file}")
     print()
@@ -229,8 +267,7 @@ def split_by_province(input_file: str, output_dir: str = "truck-parking-map/publ
     print("=" * 80)
 
 if __name__ == "__main__":
-    import sys
-
     input_file = sys.argv[1] if len(sys.argv) > 1 else "netherlands_osm_individual_parking_spaces_reclassified.geojson"
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "truck-parking-map/public/provinces"
 
-    split_by_province(input_file)
+    split_by_province(input_file, output_dir)